@@ -5,6 +5,20 @@ def create_app():
     app = Flask(__name__)
     CORS(app)  # Enable CORS for all routes
 
+    from config import Config
+    app.config.from_object(Config)
+
+    # Database engine en schema, de services zelf worden pas bij de eerste request gemaakt
+    import database
+    from .models.discount import init_db
+    database.init_db()
+    init_db(app.config['DATABASE_URL'])
+
+    @app.teardown_appcontext
+    def remove_db_session(exception=None):
+        from .models.discount import Session
+        Session.remove()
+
     # Register blueprints
     from .routes import api
     app.register_blueprint(api.bp)
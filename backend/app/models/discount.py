@@ -1,12 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, JSON, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Float, JSON, DateTime, Boolean, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from datetime import datetime
 
 Base = declarative_base()
 
 class Discount(Base):
     __tablename__ = 'discounts'
+    # Ids nooit hergebruiken, anders erft een nieuwe korting oude journal rows
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -16,7 +18,34 @@ class Discount(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-# Database setup
-engine = create_engine('sqlite:///discounts.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+    journal = relationship('ApplyJournalEntry', cascade='all, delete-orphan')
+
+class ApplyJournalEntry(Base):
+    """One successful price write of a discount run, used to roll the run back"""
+    __tablename__ = 'apply_journal'
+
+    id = Column(Integer, primary_key=True)
+    discount_id = Column(Integer, ForeignKey('discounts.id'), nullable=False, index=True)
+    product_id = Column(String, nullable=False)
+    old_price = Column(Float, nullable=False)
+    old_list_price = Column(Float, nullable=True)
+    new_price = Column(Float, nullable=False)
+    rolled_back = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Database setup, de engine wordt pas in create_app() gekoppeld via init_db()
+SessionFactory = sessionmaker()
+# Eén sessie per thread, gunicorn draait meerdere threads per worker
+Session = scoped_session(SessionFactory)
+_engine = None
+
+def init_db(database_url: str):
+    """Create the engine and schema and bind the Session factory to it"""
+    global _engine
+    _engine = create_engine(database_url)
+    Base.metadata.create_all(_engine)
+    SessionFactory.configure(bind=_engine)
+    return _engine
+
+def get_engine():
+    return _engine
@@ -1,10 +1,31 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+import json
+import threading
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from werkzeug.local import LocalProxy
 from ..services.shopware import ShopwareService
-from ..services.discount_service import DiscountService  # Nieuwe import
+from ..services.discount_service import DiscountService, DiscountNotFound  # Nieuwe import
+from ..services.discount_import import parse_discount_file
+from .http_cache import cached_json_response, json_response
 
 bp = Blueprint('api', __name__, url_prefix='/api')
-shopware_service = ShopwareService()
-discount_service = DiscountService()  # Service initialiseren
+
+_service_lock = threading.Lock()
+
+def _get_service(name, factory):
+    """Create a service on first use and keep it on the app"""
+    service = current_app.extensions.get(name)
+    if service is None:
+        # gthread workers: maar één thread mag de service maken
+        with _service_lock:
+            service = current_app.extensions.get(name)
+            if service is None:
+                service = current_app.extensions[name] = factory()
+    return service
+
+shopware_service = LocalProxy(lambda: _get_service('shopware_service', ShopwareService))
+discount_service = LocalProxy(lambda: _get_service('discount_service', lambda: DiscountService(current_app.config)))
 
 @bp.route('/credentials', methods=['GET', 'POST'])
 def manage_credentials():
@@ -46,21 +67,74 @@ def connect():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+MAX_PRICE_PAGE_SIZE = 500
+DEFAULT_PRICE_PAGE_SIZE = 100
+
 @bp.route('/products/prices', methods=['GET'])
 def get_prices():
     try:
-        prices = shopware_service.get_product_prices()
-        return jsonify({'status': 'success', 'data': prices})
+        page = request.args.get('page', 1, type=int)
+        limit = request.args.get('limit', type=int)
+        if page < 1 or (limit is not None and not 1 <= limit <= MAX_PRICE_PAGE_SIZE):
+            raise ValueError(f"page must be >= 1 and limit between 1 and {MAX_PRICE_PAGE_SIZE}")
+
+        # ids=a,b,c of ids=a&ids=b
+        product_ids = [
+            product_id for value in request.args.getlist('ids')
+            for product_id in value.split(',') if product_id
+        ]
+        if len(product_ids) > MAX_PRICE_PAGE_SIZE:
+            raise ValueError(f"At most {MAX_PRICE_PAGE_SIZE} ids per request")
+        if limit is None:
+            # Alle gevraagde producten in één pagina
+            limit = len(product_ids) if product_ids else DEFAULT_PRICE_PAGE_SIZE
+
+        # Niet server-side cachen: prijzen veranderen via andere workers, alleen ETag/304
+        prices = shopware_service.get_product_prices(product_ids or None, page=page, limit=limit)
+        return json_response({
+            'status': 'success',
+            'data': prices['data'],
+            'total': prices['total'],
+            'has_more': prices['total'] > page * limit,
+            'page': page,
+            'limit': limit
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
 @bp.route('/products/prices', methods=['PATCH'])
 def update_prices():
     try:
         data = request.json
-        updates = [data]  # Voor nu doen we één product
-        results = shopware_service.update_product_prices(updates)
+        # Eén product als object, of een lijst (ook als {"updates": [...]})
+        if isinstance(data, dict) and 'updates' in data:
+            data = data['updates']
+        updates = data if isinstance(data, list) else [data]
+
+        for index, update in enumerate(updates, start=1):
+            if not isinstance(update, dict) or 'id' not in update or 'price' not in update:
+                raise ValueError(f"Update {index}: id and price are required")
+            if not _is_number(update['price']):
+                raise ValueError(f"Update {index}: price must be a number")
+            if update.get('listPrice') is not None and not _is_number(update['listPrice']):
+                raise ValueError(f"Update {index}: listPrice must be a number or null")
+
+        if isinstance(data, list):
+            results = shopware_service.sync_product_prices(
+                updates,
+                batch_size=current_app.config['SYNC_BATCH_SIZE'],
+                min_interval=current_app.config['SYNC_MIN_INTERVAL']
+            )
+        else:
+            results = shopware_service.update_product_prices(updates)
         return jsonify({'status': 'success', 'data': results})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -68,8 +142,9 @@ def update_prices():
 def get_manufacturers():
     try:
         print("API: Getting manufacturers...")  # Debug log
-        manufacturers = shopware_service.get_manufacturers()
-        return jsonify({'status': 'success', 'data': manufacturers})
+        return cached_json_response(
+            lambda: {'status': 'success', 'data': shopware_service.get_manufacturers()}
+        )
     except Exception as e:
         print(f"API Error getting manufacturers: {str(e)}")  # Debug log
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -78,8 +153,9 @@ def get_manufacturers():
 def get_categories():
     try:
         print("API: Getting categories...")  # Debug log
-        categories = shopware_service.get_categories()
-        return jsonify({'status': 'success', 'data': categories})
+        return cached_json_response(
+            lambda: {'status': 'success', 'data': shopware_service.get_categories()}
+        )
     except Exception as e:
         print(f"API Error getting categories: {str(e)}")  # Debug log
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -88,8 +164,9 @@ def get_categories():
 def get_tags():
     try:
         print("API: Getting tags...")  # Debug log
-        tags = shopware_service.get_tags()
-        return jsonify({'status': 'success', 'data': tags})
+        return cached_json_response(
+            lambda: {'status': 'success', 'data': shopware_service.get_tags()}
+        )
     except Exception as e:
         print(f"API Error getting tags: {str(e)}")  # Debug log
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -107,6 +184,20 @@ def preview_matching_products():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@bp.route('/query-plan', methods=['POST'])
+def query_plan():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('conditions', []), list):
+            raise ValueError("Expected a JSON body with a conditions list")
+
+        plan = shopware_service.explain_query(data.get('conditions', []))
+        return jsonify({'status': 'success', 'data': plan})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/discounts', methods=['POST'])
 def create_discount():
     try:
@@ -132,13 +223,35 @@ def create_discount():
         print(f"Traceback: {traceback.format_exc()}")  # Full error traceback
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@bp.route('/discounts/import', methods=['POST'])
+def import_discounts():
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            items = parse_discount_file(upload.filename, upload.read().decode('utf-8'))
+        else:
+            data = request.json
+            items = data.get('discounts', []) if isinstance(data, dict) else data
+
+        if not items:
+            raise ValueError("No discounts to import")
+
+        print(f"API: Importing {len(items)} discounts")  # Debug log
+        results = discount_service.import_discounts(items)
+        return jsonify({'status': 'success', 'data': results})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"API Error importing discounts: {str(e)}")  # Debug log
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/discounts', methods=['GET'])
 def get_discounts():
     try:
         print("API: Getting discounts...")  # Debug log
         discounts = discount_service.get_discounts()
         print(f"API: Found {len(discounts)} discounts")  # Debug log
-        return jsonify({'status': 'success', 'data': discounts})
+        return json_response({'status': 'success', 'data': discounts})
     except Exception as e:
         print(f"API Error getting discounts: {str(e)}")  # Debug log
         import traceback
@@ -146,12 +259,68 @@ def get_discounts():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+EXPORT_FIELDS = ['product_id', 'old_price', 'new_price', 'rolled_back']
+
+def _csv_rows(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()  # Header als er geen records zijn
+
+def _ndjson_rows(records):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+@bp.route('/discounts/<int:discount_id>/products', methods=['GET'])
+def export_discount_products(discount_id):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'status': 'error', 'message': f'Unsupported format: {export_format}'}), 400
+
+    try:
+        records = discount_service.iter_applied_products(discount_id)
+    except DiscountNotFound as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except Exception as e:
+        print(f"API Error exporting discount products: {str(e)}")  # Debug log
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    if export_format == 'csv':
+        body, mimetype = _csv_rows(records), 'text/csv'
+    else:
+        body, mimetype = _ndjson_rows(records), 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=discount-{discount_id}-products.{export_format}'}
+    )
+
+@bp.route('/discounts/<int:discount_id>/rollback', methods=['POST'])
+def rollback_discount(discount_id):
+    try:
+        print(f"API: Rolling back discount {discount_id}")  # Debug log
+        summary = discount_service.rollback_discount(discount_id)
+        return jsonify({'status': 'success', 'data': summary})
+    except DiscountNotFound as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except Exception as e:
+        print(f"API Error rolling back discount: {str(e)}")  # Debug log
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/discounts/<int:discount_id>', methods=['DELETE'])
 def delete_discount(discount_id):
     try:
         print(f"API: Deleting discount {discount_id}")  # Debug log
         discount_service.delete_discount(discount_id)
         return jsonify({'status': 'success', 'message': 'Discount deleted successfully'})
+    except DiscountNotFound as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
     except Exception as e:
         print(f"API Error deleting discount: {str(e)}")  # Debug log
         import traceback
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optioneel, zonder valt het terug op gzip
+    brotli = None
+
+# request path -> serialized payload met ETag en gecomprimeerde varianten, als LRU
+_cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _store(key: str, entry: Dict[str, Any]):
+    max_entries = current_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 256)
+    now = time.monotonic()
+    with _cache_lock:
+        for expired in [k for k, e in _cache.items() if e['expires'] < now]:
+            del _cache[expired]
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > max_entries:
+            _cache.popitem(last=False)
+
+
+def _lookup(key: str) -> Optional[Dict[str, Any]]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if not entry:
+            return None
+        if entry['expires'] < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry
+
+
+def _entry(payload: Any) -> Dict[str, Any]:
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return {
+        'etag': hashlib.sha1(body).hexdigest(),
+        'identity': body
+    }
+
+
+def _pick_encoding(size: int) -> Optional[str]:
+    if size < current_app.config.get('COMPRESS_MIN_SIZE', 1024):
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _send(entry: Dict[str, Any]) -> Response:
+    encoding = _pick_encoding(len(entry['identity']))
+    etag = entry['etag'] if not encoding else f"{entry['etag']}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        if encoding and encoding not in entry:
+            if encoding == 'br':
+                entry[encoding] = brotli.compress(entry['identity'], quality=5)
+            else:
+                entry[encoding] = gzip.compress(entry['identity'], compresslevel=6)
+        response = Response(entry[encoding or 'identity'], mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def json_response(payload: Any) -> Response:
+    """JSON response with a strong ETag, 304 handling and compression"""
+    return _send(_entry(payload))
+
+
+def cached_json_response(loader: Callable[[], Any], ttl: Optional[int] = None) -> Response:
+    """Like json_response, but the payload of this request path is cached for ttl seconds.
+
+    The cache lives per process, so only use it for data this app never writes.
+    """
+    if ttl is None:
+        ttl = current_app.config.get('RESPONSE_CACHE_SECONDS', 30)
+
+    key = request.full_path
+    entry = _lookup(key)
+    if not entry:
+        entry = _entry(loader())
+        entry['expires'] = time.monotonic() + ttl
+        _store(key, entry)
+    return _send(entry)
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from typing import List, Dict, Any
+from .query_compiler import compile_conditions
+
+
+def validate_discount(item: Dict[str, Any], label: str):
+    """Raise ValueError when a discount to import has an empty or invalid field"""
+    if not isinstance(item, dict):
+        raise ValueError(f"{label}: expected an object")
+
+    name = item.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"{label}: missing required field: name")
+
+    if item.get('percentage') in (None, ''):
+        raise ValueError(f"{label}: missing required field: percentage")
+    try:
+        percentage = float(item['percentage'])
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}: percentage is not a number")
+    # Zelfde grenzen als het formulier in de frontend
+    if not 0 < percentage <= 100:
+        raise ValueError(f"{label}: percentage must be between 0 and 100")
+
+    conditions = item.get('conditions')
+    if not isinstance(conditions, list) or not conditions:
+        raise ValueError(f"{label}: missing required field: conditions")
+    for group in conditions:
+        if not isinstance(group, dict) or not isinstance(group.get('conditions', []), list):
+            raise ValueError(f"{label}: every condition group must be an object with a conditions list")
+        if not all(isinstance(condition, dict) for condition in group.get('conditions', [])):
+            raise ValueError(f"{label}: every condition must be an object")
+
+    # Zonder geldige voorwaarden zou de korting op de hele catalogus vallen
+    if not compile_conditions(conditions):
+        raise ValueError(f"{label}: conditions do not contain any valid condition")
+
+
+def parse_discount_file(filename: str, content: str) -> List[Dict[str, Any]]:
+    """Parse a CSV or JSON discount file into a list of discount dicts.
+
+    JSON is either a list of discounts or {"discounts": [...]}. CSV needs the
+    columns name, percentage and conditions, where conditions is the JSON
+    condition groups as sent by the frontend.
+    """
+    if filename.lower().endswith('.json'):
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('discounts', [])
+        if not isinstance(data, list):
+            raise ValueError("JSON import must contain a list of discounts")
+        return data
+
+    if filename.lower().endswith('.csv'):
+        discounts = []
+        for line, row in enumerate(csv.DictReader(io.StringIO(content)), start=2):
+            try:
+                conditions = json.loads(row['conditions']) if row.get('conditions') else None
+            except ValueError:
+                raise ValueError(f"Line {line}: conditions is not valid JSON")
+            discount = {
+                'name': row.get('name'),
+                'percentage': row.get('percentage'),
+                'conditions': conditions
+            }
+            validate_discount(discount, f"Line {line}")
+            discounts.append(discount)
+        return discounts
+
+    raise ValueError(f"Unsupported import file: {filename}")
@@ -1,18 +1,33 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Mapping, Optional
 from sqlalchemy.orm import Session
-from ..models.discount import Discount, Session as DBSession
+from ..models.discount import Discount, ApplyJournalEntry, Session as DBSession, SessionFactory
 from .shopware import ShopwareService
+from .query_compiler import CONDITION_FIELDS, any_of, compile_conditions, matches_all
+from .price_record import PriceRecord
+from .discount_import import validate_discount
+from config import Config
+
+class DiscountNotFound(Exception):
+    pass
 
 class DiscountService:
-    def __init__(self):
+    def __init__(self, config: Optional[Mapping[str, Any]] = None):
         self.shopware_service = ShopwareService()
-        self.db = DBSession()
+        # Normaal app.config uit create_app(), los gebruikt de defaults uit Config
+        self.config = config if config is not None else {
+            key: getattr(Config, key) for key in dir(Config) if key.isupper()
+        }
+
+    @property
+    def db(self):
+        """The database session of the current thread, removed again after each request"""
+        return DBSession()
 
     def create_discount(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new discount and apply it to matching products"""
         try:
             # Get matching products to count them
-            matching_products = self.shopware_service.get_matching_products(data['conditions'])
+            matching_products = list(self.shopware_service.iter_matching_price_records(data['conditions']))
             print(f"Found {len(matching_products)} matching products")  # Debug log
 
             # Create discount record
@@ -27,41 +42,56 @@ class DiscountService:
             self.db.add(discount)
             self.db.commit()
 
-            # Apply discount to products
-            results = []
-            for product in matching_products:
-                try:
-                    # Safely get price data
-                    if not product.get('price') or not product['price']:
-                        print(f"Skipping product {product.get('id', 'unknown')} - no price data")
-                        continue
+            # Apply discount in sync batches, journal committed after every batch so each
+            # written price can be rolled back, also when the worker dies mid-run
+            percentage = float(data['percentage'])
+            updates = [{
+                'id': product.id,
+                'price': product.gross * (1 - (percentage / 100)),
+                'listPrice': product.gross
+            } for product in matching_products]
+            records = {product.id: product for product in matching_products}
+            new_prices = {update['id']: update['price'] for update in updates}
 
-                    price_data = product['price'][0] if isinstance(product['price'], list) else None
-                    if not price_data or 'gross' not in price_data:
-                        print(f"Skipping product {product.get('id', 'unknown')} - invalid price structure")
+            attempts = 0
+            failed = 0
+            rolled_back = None
+            for batch_results in self.shopware_service.iter_sync_product_prices(
+                updates, batch_size=self.config['SYNC_BATCH_SIZE'], min_interval=self.config['SYNC_MIN_INTERVAL']
+            ):
+                for result in batch_results:
+                    attempts += 1
+                    if result['status'] != 'success':
+                        failed += 1
                         continue
+                    product = records[result['id']]
+                    self.db.add(ApplyJournalEntry(
+                        discount_id=discount.id,
+                        product_id=product.id,
+                        old_price=product.gross,
+                        old_list_price=product.list_price,
+                        new_price=new_prices[product.id]
+                    ))
+                self.db.commit()
 
-                    current_price = price_data['gross']
-                    new_price = current_price * (1 - (float(data['percentage']) / 100))
+                if self._failure_threshold_exceeded(attempts, failed):
+                    print(f"Failure rate too high ({failed}/{attempts}), rolling back discount {discount.id}")
+                    rolled_back = self._rollback_entries(discount.id)
+                    break
 
-                    update_result = self.shopware_service.update_product_prices([{
-                        'id': product['id'],
-                        'price': new_price,
-                        'listPrice': current_price
-                    }])
-
-                    results.extend(update_result)
-
-                except Exception as product_error:
-                    print(f"Error processing product {product.get('id', 'unknown')}: {str(product_error)}")
-                    continue
+            discount.affected_products = self._pending_count(discount.id)
+            self.db.commit()
 
-            return {
+            result = {
                 'id': discount.id,
                 'name': discount.name,
                 'percentage': discount.percentage,
-                'affected_products': len(results)
+                'affected_products': discount.affected_products,
+                'failed_products': failed
             }
+            if rolled_back:
+                result['rolled_back'] = rolled_back
+            return result
 
         except Exception as e:
             self.db.rollback()
@@ -71,6 +101,167 @@ class DiscountService:
         finally:
             self.db.close()
 
+    def import_discounts(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many discounts at once and write all their prices in one batched run.
+
+        All condition sets are resolved with one combined OR search, each product is
+        fetched once and assigned locally to the first discount in the file it matches.
+        When too many writes fail, every discount of the import is rolled back.
+        """
+        try:
+            for index, item in enumerate(items, start=1):
+                validate_discount(item, f"Discount {index}")
+
+            planned = []
+            summary = {}
+            for item in items:
+                discount = Discount(
+                    name=item['name'],
+                    percentage=float(item['percentage']),
+                    conditions=item['conditions'],
+                    affected_products=0
+                )
+                self.db.add(discount)
+                planned.append((discount, compile_conditions(item['conditions'])))
+            self.db.commit()
+
+            for discount, _ in planned:
+                summary[discount.id] = {
+                    'id': discount.id,
+                    'name': discount.name,
+                    'percentage': discount.percentage,
+                    'affected_products': 0,
+                    'failed_products': 0,
+                    'skipped_products': 0
+                }
+
+            # Eén zoekopdracht voor alle kortingen, producten lokaal toewijzen
+            unique_filters = []
+            for _, product_filter in planned:
+                if product_filter not in unique_filters:
+                    unique_filters.append(product_filter)
+            fields = ['id', 'price'] + [field.split('.', 1)[1] for field in CONDITION_FIELDS.values()]
+
+            updates = []
+            claims = {}
+            for product in self.shopware_service.iter_search_products(any_of(unique_filters), fields):
+                matched = [discount for discount, product_filter in planned if matches_all(product_filter, product)]
+                record = PriceRecord.from_product(product) if matched else None
+                if not record or record.id in claims:
+                    continue
+                for other in matched[1:]:
+                    summary[other.id]['skipped_products'] += 1
+                discount = matched[0]
+                claims[record.id] = (discount, record)
+                updates.append({
+                    'id': record.id,
+                    'price': record.gross * (1 - (discount.percentage / 100)),
+                    'listPrice': record.gross
+                })
+            print(f"Resolved {len(items)} discounts with 1 search, {len(updates)} products to update")  # Debug log
+
+            # Per batch journalen en committen, zodat elke geschreven prijs terug te draaien is
+            new_prices = {update['id']: update['price'] for update in updates}
+            attempts = 0
+            failed = 0
+            for batch_results in self.shopware_service.iter_sync_product_prices(
+                updates, batch_size=self.config['SYNC_BATCH_SIZE'], min_interval=self.config['SYNC_MIN_INTERVAL']
+            ):
+                for result in batch_results:
+                    attempts += 1
+                    discount, record = claims[result['id']]
+                    if result['status'] != 'success':
+                        failed += 1
+                        summary[discount.id]['failed_products'] += 1
+                        continue
+                    self.db.add(ApplyJournalEntry(
+                        discount_id=discount.id,
+                        product_id=record.id,
+                        old_price=record.gross,
+                        old_list_price=record.list_price,
+                        new_price=new_prices[record.id]
+                    ))
+                self.db.commit()
+
+                if self._failure_threshold_exceeded(attempts, failed):
+                    print(f"Failure rate too high ({failed}/{attempts}), rolling back import")
+                    for discount, _ in planned:
+                        summary[discount.id]['rolled_back'] = self._rollback_entries(discount.id)
+                    break
+
+            for discount, _ in planned:
+                discount.affected_products = self._pending_count(discount.id)
+                summary[discount.id]['affected_products'] = discount.affected_products
+            self.db.commit()
+            return list(summary.values())
+
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error in import_discounts: {str(e)}")  # Debug log
+            raise
+
+        finally:
+            self.db.close()
+
+    def _failure_threshold_exceeded(self, attempts: int, failed: int) -> bool:
+        if attempts < self.config['ROLLBACK_MIN_ATTEMPTS']:
+            return False
+        return failed / attempts > self.config['ROLLBACK_FAILURE_THRESHOLD']
+
+    def _pending_count(self, discount_id: int) -> int:
+        """Number of journaled products that still carry this discount"""
+        return self.db.query(ApplyJournalEntry).filter(
+            ApplyJournalEntry.discount_id == discount_id,
+            ApplyJournalEntry.rolled_back == False  # noqa: E712
+        ).count()
+
+    def _rollback_entries(self, discount_id: int) -> Dict[str, int]:
+        """Restore all journaled products of a discount in batches"""
+        entries = self.db.query(ApplyJournalEntry).filter(
+            ApplyJournalEntry.discount_id == discount_id,
+            ApplyJournalEntry.rolled_back == False  # noqa: E712
+        ).all()
+        if not entries:
+            return {'restored': 0, 'failed': 0}
+
+        by_product = {entry.product_id: entry for entry in entries}
+        results = self.shopware_service.sync_product_prices([{
+            'id': entry.product_id,
+            'price': entry.old_price,
+            'listPrice': entry.old_list_price
+        } for entry in entries], batch_size=self.config['SYNC_BATCH_SIZE'], min_interval=self.config['SYNC_MIN_INTERVAL'])
+
+        restored = 0
+        for result in results:
+            if result['status'] == 'success':
+                by_product[result['id']].rolled_back = True
+                restored += 1
+        self.db.commit()
+
+        print(f"Rollback of discount {discount_id}: {restored} restored, {len(results) - restored} failed")
+        return {'restored': restored, 'failed': len(results) - restored}
+
+    def rollback_discount(self, discount_id: int) -> Dict[str, int]:
+        """Undo a discount run using its apply journal"""
+        try:
+            discount = self.db.query(Discount).filter(Discount.id == discount_id).first()
+            if not discount:
+                raise DiscountNotFound('Discount not found')
+
+            summary = self._rollback_entries(discount_id)
+            # Mislukte restores blijven meetellen
+            discount.affected_products = self._pending_count(discount_id)
+            self.db.commit()
+            return summary
+
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error in rollback_discount: {str(e)}")  # Debug log
+            raise
+
+        finally:
+            self.db.close()
+
     def get_discounts(self) -> List[Dict[str, Any]]:
         """Get all discounts"""
         discounts = self.db.query(Discount).order_by(Discount.created_at.desc()).all()
@@ -87,7 +278,7 @@ class DiscountService:
         """Get a specific discount"""
         discount = self.db.query(Discount).filter(Discount.id == discount_id).first()
         if not discount:
-            raise Exception('Discount not found')
+            raise DiscountNotFound('Discount not found')
 
         return {
             'id': discount.id,
@@ -98,6 +289,30 @@ class DiscountService:
             'created_at': discount.created_at.isoformat()
         }
 
+    def iter_applied_products(self, discount_id: int, chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield the journaled products of a discount one by one, chunk_size rows per query"""
+        if not self.db.query(Discount.id).filter(Discount.id == discount_id).first():
+            raise DiscountNotFound('Discount not found')
+
+        return self._stream_journal(discount_id, chunk_size)
+
+    def _stream_journal(self, discount_id: int, chunk_size: int) -> Iterator[Dict[str, Any]]:
+        # Eigen sessie, de generator loopt nog door nadat de request handler klaar is
+        session = SessionFactory()
+        try:
+            query = session.query(ApplyJournalEntry).filter(
+                ApplyJournalEntry.discount_id == discount_id
+            ).order_by(ApplyJournalEntry.id).yield_per(chunk_size)
+            for entry in query:
+                yield {
+                    'product_id': entry.product_id,
+                    'old_price': entry.old_price,
+                    'new_price': entry.new_price,
+                    'rolled_back': bool(entry.rolled_back)
+                }
+        finally:
+            session.close()
+
     def delete_discount(self, discount_id: int):
         """Delete a discount and restore original prices"""
         try:
@@ -107,35 +322,48 @@ class DiscountService:
             discount = self.db.query(Discount).filter(Discount.id == discount_id).first()
             if not discount:
                 print(f"Discount {discount_id} not found")  # Debug log
-                raise Exception('Discount not found')
+                raise DiscountNotFound('Discount not found')
 
             print(f"Found discount: {discount.name}")  # Debug log
 
+            journaled = self.db.query(ApplyJournalEntry).filter(
+                ApplyJournalEntry.discount_id == discount_id
+            ).count()
             try:
-                # Get matching products to restore prices
-                matching_products = self.shopware_service.get_matching_products(discount.conditions)
-                print(f"Found {len(matching_products)} products to restore")  # Debug log
+                if journaled:
+                    # Restore exactly the products this discount touched
+                    self._rollback_entries(discount_id)
+                else:
+                    # Get matching products to restore prices
+                    # Collect product IDs
+                    product_ids = [
+                        record.id for record in self.shopware_service.iter_matching_price_records(discount.conditions)
+                    ]
+                    print(f"Found {len(product_ids)} products to restore")  # Debug log
 
-                # Collect product IDs
-                product_ids = [p['id'] for p in matching_products if p.get('id')]
+                    if product_ids:
+                        # Restore all prices in one go
+                        restore_results = self.shopware_service.restore_product_prices(product_ids)
 
-                if product_ids:
-                    # Restore all prices in one go
-                    restore_results = self.shopware_service.restore_product_prices(product_ids)
-
-                    # Log results
-                    success_count = len([r for r in restore_results if r['status'] == 'success'])
-                    error_count = len([r for r in restore_results if r['status'] == 'error'])
-                    print(f"Price restoration complete: {success_count} successful, {error_count} failed")
-                else:
-                    print("No products found to restore prices for")
+                        # Log results
+                        success_count = len([r for r in restore_results if r['status'] == 'success'])
+                        error_count = len([r for r in restore_results if r['status'] == 'error'])
+                        print(f"Price restoration complete: {success_count} successful, {error_count} failed")
+                    else:
+                        print("No products found to restore prices for")
 
             except Exception as restore_error:
                 print(f"Error restoring prices: {str(restore_error)}")
                 # Continue with deletion even if price restoration fails
                 pass
 
-            # Delete from database
+            if journaled:
+                # Journal rows zijn de enige manier om terug te draaien, dus niet weggooien
+                pending = self._pending_count(discount_id)
+                if pending:
+                    raise Exception(f'{pending} products could not be restored, discount kept so the delete can be retried')
+
+            # Delete from database, the journal rows go with it
             print("Deleting discount from database")  # Debug log
             self.db.delete(discount)
             self.db.commit()
@@ -150,7 +378,3 @@ class DiscountService:
 
         finally:
             self.db.close()
-
-    def __del__(self):
-        """Close database session"""
-        self.db.close()
@@ -0,0 +1,33 @@
+import sys
+from typing import Optional, Dict, Any
+
+
+class PriceRecord:
+    """Compact price data of one product, all the apply and restore paths need"""
+    __slots__ = ('id', 'gross', 'list_price')
+
+    def __init__(self, product_id: str, gross: float, list_price: Optional[float] = None):
+        self.id = sys.intern(product_id)
+        self.gross = float(gross)
+        self.list_price = None if list_price is None else float(list_price)
+
+    @classmethod
+    def from_product(cls, product: Dict[str, Any]) -> Optional['PriceRecord']:
+        """Build a record from a Shopware product dict, None when it has no usable price"""
+        if not product.get('id'):
+            return None
+
+        if not product.get('price') or not product['price']:
+            print(f"Skipping product {product['id']} - no price data")
+            return None
+
+        price_data = product['price'][0] if isinstance(product['price'], list) else None
+        if not price_data or 'gross' not in price_data:
+            print(f"Skipping product {product['id']} - invalid price structure")
+            return None
+
+        list_price = price_data.get('listPrice') or {}
+        return cls(product['id'], price_data['gross'], list_price.get('gross'))
+
+    def __repr__(self):
+        return f"PriceRecord({self.id!r}, {self.gross!r}, {self.list_price!r})"
@@ -0,0 +1,145 @@
+from typing import List, Dict, Any, Tuple
+
+# Frontend condition type -> Shopware product veld
+CONDITION_FIELDS = {
+    'manufacturer': 'product.manufacturerId',
+    'category': 'product.categoryTree',
+    'tag': 'product.tagIds',
+}
+
+
+def _leaf(field: str, values: List[str]) -> Dict[str, Any]:
+    """Single value -> equals, meerdere waarden -> equalsAny"""
+    if len(values) == 1:
+        return {"type": "equals", "field": field, "value": values[0]}
+    return {"type": "equalsAny", "field": field, "value": values}
+
+
+def _combine(operator: str, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if len(queries) == 1:
+        return queries[0]
+    return {"type": "multi", "operator": operator, "queries": queries}
+
+
+def _collect(group: Dict) -> Tuple[Dict[str, List[str]], Dict[str, List[str]], int]:
+    """Split group conditions into positive and negated values per field, deduplicated and in order"""
+    positive: Dict[str, List[str]] = {}
+    negated: Dict[str, List[str]] = {}
+    used = 0
+
+    for condition in group.get('conditions', []):
+        field = CONDITION_FIELDS.get(condition.get('type'))
+        value = condition.get('value')
+        if not field or not value:
+            print(f"Skipping condition without value or unknown type: {condition}")  # Debug log
+            continue
+
+        target = negated if condition.get('operator') == 'not_equals' else positive
+        values = target.setdefault(field, [])
+        if value not in values:
+            values.append(value)
+        used += 1
+
+    return positive, negated, used
+
+
+def compile_group(group: Dict) -> Tuple[Dict[str, Any], List[str]]:
+    """Compile one condition group to a single Shopware filter plus explain lines.
+
+    OR groups fold same-field values into one equalsAny. In AND groups the
+    positive values stay separate (a product must match each of them), while
+    negated values are folded into a single NOT equalsAny.
+    Returns (None, []) when the group has no usable conditions.
+    """
+    operator = 'OR' if group.get('operator') == 'OR' else 'AND'
+    positive, negated, used = _collect(group)
+    queries = []
+    plan = []
+
+    for field, values in positive.items():
+        if operator == 'OR':
+            leaf = _leaf(field, values)
+            queries.append(leaf)
+            plan.append(f"{field} {leaf['type']} {leaf['value']}")
+        else:
+            for value in values:
+                queries.append(_leaf(field, [value]))
+                plan.append(f"{field} equals {value}")
+
+    for field, values in negated.items():
+        if operator == 'AND':
+            leafs = [_leaf(field, values)]
+        else:
+            leafs = [_leaf(field, [value]) for value in values]
+        for leaf in leafs:
+            queries.append({"type": "not", "operator": "AND", "queries": [leaf]})
+            plan.append(f"NOT {field} {leaf['type']} {leaf['value']}")
+
+    if not queries:
+        return None, []
+
+    if used > len(queries):
+        plan.append(f"merged {used} conditions into {len(queries)} filters")
+
+    return _combine(operator, queries), [f"{operator}: {line}" for line in plan]
+
+
+def compile_conditions(conditions: List[Dict]) -> List[Dict[str, Any]]:
+    """Convert frontend condition groups to a list of Shopware filters (combined with AND)"""
+    return explain_conditions(conditions)['filter']
+
+
+def explain_conditions(conditions: List[Dict]) -> Dict[str, Any]:
+    """Compile condition groups and return the filter together with a readable query plan"""
+    filters = []
+    plan = []
+
+    for index, group in enumerate(conditions, start=1):
+        group_filter, group_plan = compile_group(group)
+        if group_filter is None:
+            plan.append(f"group {index}: skipped, no valid conditions")
+            continue
+        filters.append(group_filter)
+        plan.extend(f"group {index} {line}" for line in group_plan)
+
+    return {
+        'filter': filters,
+        'plan': plan,
+        'condition_count': sum(len(g.get('conditions', [])) for g in conditions),
+        'filter_count': len(filters)
+    }
+
+
+def matches(query: Dict[str, Any], product: Dict[str, Any]) -> bool:
+    """Evaluate a compiled filter locally against a product from a search with these fields included.
+
+    Follows Shopware: equals on a list field (categoryTree, tagIds) means the list contains the value.
+    """
+    if query['type'] == 'multi':
+        results = (matches(q, product) for q in query['queries'])
+        return any(results) if query['operator'].upper() == 'OR' else all(results)
+
+    if query['type'] == 'not':
+        return not matches({"type": "multi", "operator": query['operator'], "queries": query['queries']}, product)
+
+    values = query['value'] if query['type'] == 'equalsAny' else [query['value']]
+    actual = product.get(query['field'].split('.', 1)[1])
+    if isinstance(actual, list):
+        return any(value in actual for value in values)
+    return actual in values
+
+
+def matches_all(filters: List[Dict[str, Any]], product: Dict[str, Any]) -> bool:
+    """Top-level filters are combined with AND, like in the search request"""
+    return all(matches(query, product) for query in filters)
+
+
+def any_of(filters: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Combine several top-level filter lists into one filter matching any of them"""
+    if len(filters) == 1:
+        return filters[0]
+    return [{
+        "type": "multi",
+        "operator": "OR",
+        "queries": [_combine('AND', f) for f in filters]
+    }]
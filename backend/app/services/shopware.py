@@ -1,15 +1,23 @@
+import time
 import requests
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from datetime import datetime, timedelta
 from database import get_db
+from .query_compiler import compile_conditions, explain_conditions
+from .price_record import PriceRecord
 
 class ShopwareService:
     _instance = None
+    _initialized = False
 
     def __init__(self):
+            # Singleton: credentials alleen bij de eerste constructie uit SQLite lezen
+            if self._initialized:
+                return
             self.access_token = None
             self.token_expires_at = None
             self._load_credentials()
+            self._initialized = True
 
     def _load_credentials(self):
         with get_db() as db:
@@ -37,8 +45,22 @@ class ShopwareService:
             cls._instance.client_id = None
             cls._instance.client_secret = None
             cls._instance.token_expires_at = None
+            cls._instance.http = requests.Session()  # Keep-alive verbindingen naar Shopware
         return cls._instance
 
+    def reset_connections(self):
+        """Drop the HTTP session and token, needed in every forked worker process"""
+        self.http.close()
+        self.http = requests.Session()
+        self.access_token = None
+        self.token_expires_at = None
+
+    def warm_up(self) -> bool:
+        """Fetch a token up front so the first request doesn't pay for it"""
+        if not self.base_url:
+            return False
+        return self.ensure_token()
+
     def test_connection(self, url: str, client_id: str, client_secret: str) -> bool:
         """Test connection to Shopware with provided credentials"""
         self.base_url = url
@@ -59,7 +81,7 @@ class ShopwareService:
             return True
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/api/oauth/token",
                 json={
                     "grant_type": "client_credentials",
@@ -82,33 +104,38 @@ class ShopwareService:
             print(f"Token refresh failed: {str(e)}")
             return False
 
-    def get_product_prices(self, product_ids: List[str] = None) -> List[Dict[str, Any]]:
-        """Get current prices for products"""
+    def get_product_prices(self, product_ids: List[str] = None, page: int = 1,
+                           limit: int = 100) -> Dict[str, Any]:
+        """Get current prices for products, one page at a time.
+
+        product_ids limits the result to those products with a single equalsAny search.
+        Returns {'data': [...], 'total': n}. total uses Shopware's next-pages count mode:
+        it is exact up to a few pages ahead, enough to know whether there is a next page.
+        """
         if not self.ensure_token():
             raise Exception("Could not authenticate with Shopware")
 
         try:
+            # Shopware negeert page zonder limit, dus altijd beide meesturen
+            criteria = {"page": page, "limit": limit, "total-count-mode": 2}
             # Als er specifieke product IDs zijn, halen we alleen die op
-            url = f"{self.base_url}/api/product"
-            if product_ids and len(product_ids) == 1:
-                url = f"{url}/{product_ids[0]}"
-            elif product_ids:
-                # TODO: Implementeer filter voor meerdere producten
-                pass
-
-            response = requests.get(
-                url,
+            if product_ids:
+                criteria["filter"] = [{"type": "equalsAny", "field": "id", "value": product_ids}]
+
+            response = self.http.post(
+                f"{self.base_url}/api/search/product",
                 headers={
                     "Authorization": f"Bearer {self.access_token}",
-                    "Accept": "application/json"
-                }
+                    "Accept": "application/json",
+                    "Content-Type": "application/json"
+                },
+                json=criteria
             )
 
             if response.status_code == 200:
                 data = response.json()
-                if 'data' in data:
-                    return data['data']
-                return [data]  # Single product response
+                products = data.get('data', [])
+                return {'data': products, 'total': data.get('total', len(products))}
             else:
                 print(f"API Response: {response.text}")
                 raise Exception(f"Error fetching product prices: {response.status_code}")
@@ -124,24 +151,9 @@ class ShopwareService:
         try:
             results = []
             for update in updates:
-                price_data = {
-                    "price": [{
-                        "currencyId": "b7d2554b0ce847cd82f3ac9bd1c0dfca",  # Default EUR currency ID
-                        "gross": update['price'],
-                        "net": update['price'] / 1.21,  # BTW berekening (21%)
-                        "linked": True
-                    }]
-                }
-
-                # Alleen listPrice toevoegen als die niet null is
-                if update.get('listPrice') is not None:
-                    price_data["price"][0]["listPrice"] = {
-                        "gross": update['listPrice'],
-                        "net": update['listPrice'] / 1.21,
-                        "linked": True
-                    }
+                price_data = self._price_payload(update['price'], update.get('listPrice'))
 
-                response = requests.patch(
+                response = self.http.patch(
                     f"{self.base_url}/api/product/{update['id']}",
                     headers={
                         "Authorization": f"Bearer {self.access_token}",
@@ -171,6 +183,89 @@ class ShopwareService:
             print(f"Error updating product prices: {str(e)}")
             raise
 
+    def _price_payload(self, price: float, list_price: Optional[float] = None) -> Dict[str, Any]:
+        """Build the price field for a product write, listPrice is only set when given"""
+        price_data = {
+            "price": [{
+                "currencyId": "b7d2554b0ce847cd82f3ac9bd1c0dfca",  # Default EUR currency ID
+                "gross": price,
+                "net": price / 1.21,  # BTW berekening (21%)
+                "linked": True
+            }]
+        }
+
+        # Alleen listPrice toevoegen als die niet null is
+        if list_price is not None:
+            price_data["price"][0]["listPrice"] = {
+                "gross": list_price,
+                "net": list_price / 1.21,
+                "linked": True
+            }
+
+        return price_data
+
+    def sync_product_prices(self, updates: List[Dict[str, Any]], batch_size: int = 100,
+                            min_interval: float = 0) -> List[Dict[str, Any]]:
+        """Write many prices at once through the sync API, see iter_sync_product_prices"""
+        results = []
+        for batch_results in self.iter_sync_product_prices(updates, batch_size, min_interval):
+            results.extend(batch_results)
+        return results
+
+    def iter_sync_product_prices(self, updates: List[Dict[str, Any]], batch_size: int = 100,
+                                 min_interval: float = 0) -> Iterator[List[Dict[str, Any]]]:
+        """Write prices through the sync API, batch_size products per request, yielding the results per batch.
+
+        min_interval is the pause in seconds between two sync requests.
+
+        A batch is written as a whole, so every product in a failed batch is reported as error,
+        also when the request itself fails (timeout, connection error).
+        """
+        if not self.ensure_token():
+            raise Exception("Could not authenticate with Shopware")
+
+        for start in range(0, len(updates), batch_size):
+            if start and min_interval:
+                time.sleep(min_interval)  # Rate limit tussen sync requests
+            batch = updates[start:start + batch_size]
+            payload = [
+                {"id": update['id'], **self._price_payload(update['price'], update.get('listPrice'))}
+                for update in batch
+            ]
+
+            try:
+                response = self.http.post(
+                    f"{self.base_url}/api/_action/sync",
+                    headers={
+                        "Authorization": f"Bearer {self.access_token}",
+                        "Accept": "application/json",
+                        "Content-Type": "application/json",
+                        "fail-on-error": "true"
+                    },
+                    json={
+                        "price-sync": {
+                            "entity": "product",
+                            "action": "upsert",
+                            "payload": payload
+                        }
+                    }
+                )
+            except requests.RequestException as e:
+                print(f"Failed to sync batch of {len(batch)} products: {str(e)}")
+                yield [{'id': update['id'], 'status': 'error', 'message': str(e)} for update in batch]
+                continue
+
+            if response.status_code in [200, 204]:
+                print(f"Synced prices for {len(batch)} products")  # Debug log
+                yield [{'id': update['id'], 'status': 'success'} for update in batch]
+            else:
+                print(f"Failed to sync batch of {len(batch)} products: {response.text}")
+                yield [{
+                    'id': update['id'],
+                    'status': 'error',
+                    'message': response.text
+                } for update in batch]
+
     def restore_product_prices(self, product_ids: List[str]) -> List[Dict[str, Any]]:
         """Restore original prices for products by removing discounts"""
         if not self.ensure_token():
@@ -182,7 +277,7 @@ class ShopwareService:
                 print(f"Restoring price for product {product_id}")  # Debug log
 
                 # Eerst huidige product data ophalen
-                response = requests.get(
+                response = self.http.get(
                     f"{self.base_url}/api/product/{product_id}",
                     headers={
                         "Authorization": f"Bearer {self.access_token}",
@@ -208,7 +303,7 @@ class ShopwareService:
                 print(f"Found original price {original_price} for product {product_id}")
 
                 # Update price to original and remove listPrice
-                update_response = requests.patch(
+                update_response = self.http.patch(
                     f"{self.base_url}/api/product/{product_id}",
                     headers={
                         "Authorization": f"Bearer {self.access_token}",
@@ -253,7 +348,7 @@ class ShopwareService:
             raise Exception("Could not authenticate with Shopware")
 
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/api/product-manufacturer",  # Correcte endpoint
                 headers={
                     "Authorization": f"Bearer {self.access_token}",
@@ -280,7 +375,7 @@ class ShopwareService:
             raise Exception("Could not authenticate with Shopware")
 
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/api/category",
                 headers={
                     "Authorization": f"Bearer {self.access_token}",
@@ -303,7 +398,7 @@ class ShopwareService:
             raise Exception("Could not authenticate with Shopware")
 
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/api/tag",
                 headers={
                     "Authorization": f"Bearer {self.access_token}",
@@ -331,7 +426,7 @@ class ShopwareService:
 
         try:
             print("Getting new token...")  # Debug log
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/api/oauth/token",
                 json={
                     "grant_type": "client_credentials",
@@ -367,7 +462,7 @@ class ShopwareService:
             query_params = self._build_query_from_conditions(conditions)
             print("Sending search request with params:", query_params)  # Debug log
 
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/api/search/product",
                 headers={
                     "Authorization": f"Bearer {self.access_token}",
@@ -396,12 +491,60 @@ class ShopwareService:
             print(f"Error getting matching products: {str(e)}")
             raise
 
+    def iter_matching_price_records(self, conditions: List[Dict], page_size: int = 500) -> Iterator[PriceRecord]:
+        """Yield a PriceRecord for every product matching the conditions, page by page.
+
+        Only id and price are requested, and each page is turned into records before
+        the next one is fetched, so the full product dicts never pile up.
+        """
+        for product in self.iter_search_products(compile_conditions(conditions), ['id', 'price'], page_size):
+            record = PriceRecord.from_product(product)
+            if record:
+                yield record
+
+    def iter_search_products(self, product_filter: List[Dict], fields: List[str],
+                             page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield every product matching the filter with only the given fields, one page in memory at a time"""
+        if not self.ensure_token():
+            raise Exception("Could not authenticate with Shopware")
+
+        page = 1
+        while True:
+            response = self.http.post(
+                f"{self.base_url}/api/search/product",
+                headers={
+                    "Authorization": f"Bearer {self.access_token}",
+                    "Accept": "application/json",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "limit": page_size,
+                    "page": page,
+                    "filter": product_filter,
+                    "sort": [{"field": "id", "order": "ASC"}],  # Vaste volgorde, anders missen of dubbelen pagina's producten
+                    "includes": {"product": fields},
+                    "total-count-mode": 0
+                }
+            )
+
+            if response.status_code != 200:
+                print(f"Search response error: {response.text}")  # Debug log
+                raise Exception(f"Error fetching matching products: {response.text}")
+
+            products = response.json().get('data', [])
+            del response  # Ruwe body vrijgeven voordat de producten worden verwerkt
+            yield from products
+
+            if len(products) < page_size:
+                return
+            page += 1
+
     def _build_query_from_conditions(self, conditions: List[Dict]) -> Dict:
         """Convert frontend conditions to Shopware API query"""
         print("Building query from conditions:", conditions)  # Debug log
 
         query = {
-            "filter": [],
+            "filter": compile_conditions(conditions),
             "associations": {
                 "categories": {},
                 "tags": {},
@@ -409,55 +552,13 @@ class ShopwareService:
             }
         }
 
-        for group in conditions:
-            group_filters = []
-            for condition in group.get('conditions', []):
-                print(f"Processing condition: {condition}")  # Debug log
-
-                if not condition.get('value'):
-                    print(f"Skipping condition without value: {condition}")
-                    continue
-
-                if condition['type'] == 'manufacturer':
-                    filter_item = {
-                        "type": "equals",
-                        "field": "product.manufacturerId",
-                        "value": condition['value']
-                    }
-                    group_filters.append(filter_item)
-                    print(f"Added manufacturer filter: {filter_item}")  # Debug log
-
-                elif condition['type'] == 'category':
-                    filter_item = {
-                        "type": "equals",
-                        "field": "product.categoryTree",
-                        "value": condition['value']
-                    }
-                    group_filters.append(filter_item)
-                    print(f"Added category filter: {filter_item}")  # Debug log
-
-                elif condition['type'] == 'tag':
-                    filter_item = {
-                        "type": "contains",
-                        "field": "product.tagIds",
-                        "value": [condition['value']]
-                    }
-                    group_filters.append(filter_item)
-                    print(f"Added tag filter: {filter_item}")  # Debug log
-
-            if group_filters:  # Only add if there are valid filters
-                if group.get('operator') == 'OR' and len(group_filters) > 1:
-                    query['filter'].append({
-                        "type": "multi",
-                        "operator": "OR",
-                        "queries": group_filters
-                    })
-                else:
-                    query['filter'].extend(group_filters)
-
         print("Final query:", query)  # Debug log
         return query
 
+    def explain_query(self, conditions: List[Dict]) -> Dict[str, Any]:
+        """Return the compiled filter and query plan without calling Shopware"""
+        return explain_conditions(conditions)
+
     def create_discount(self, name: str, percentage: float, conditions: List[Dict]) -> Dict:
         """Create a new discount and apply it to matching products"""
         # Eerst matching products ophalen
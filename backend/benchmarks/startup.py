@@ -0,0 +1,37 @@
+# backend/benchmarks/startup.py
+#
+# Meet hoe lang importeren en create_app() duren in een vers proces.
+# Draai vanuit backend/:  python benchmarks/startup.py [runs]
+import subprocess
+import sys
+import statistics
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+import app.routes.api
+imported = time.perf_counter()
+from app import create_app
+create_app()
+created = time.perf_counter()
+print(imported - start, created - imported)
+"""
+
+
+def measure(runs: int):
+    imports, creates = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', SNIPPET], capture_output=True, text=True, check=True
+        ).stdout.split()
+        imports.append(float(output[-2]))
+        creates.append(float(output[-1]))
+    return imports, creates
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    imports, creates = measure(runs)
+    for label, values in [('import app.routes.api', imports), ('create_app()', creates)]:
+        print(f"{label:24} median {statistics.median(values) * 1000:7.1f} ms   "
+              f"min {min(values) * 1000:7.1f} ms   ({runs} runs)")
@@ -1,4 +1,16 @@
 # backend/config.py
 class Config:
     DATABASE_FILE = "credentials.db"
-    SECRET_KEY = "your-secret-key"  # Voor eventuele encryptie
\ No newline at end of file
+    DATABASE_URL = "sqlite:///discounts.db"
+
+    # API responses
+    RESPONSE_CACHE_SECONDS = 30  # Hoe lang Shopware reads (categorieën, tags, ...) gecached worden
+    RESPONSE_CACHE_MAX_ENTRIES = 256  # Maximaal aantal gecachte responses per worker
+    COMPRESS_MIN_SIZE = 1024  # Kleinere responses niet comprimeren
+    SECRET_KEY = "your-secret-key"  # Voor eventuele encryptie
+
+    # Apply journal / rollback
+    SYNC_BATCH_SIZE = 100  # Aantal producten per _action/sync request
+    SYNC_MIN_INTERVAL = 0.2  # Seconden tussen twee sync requests (rate limit)
+    ROLLBACK_FAILURE_THRESHOLD = 0.2  # Fractie mislukte writes waarna automatisch wordt teruggedraaid
+    ROLLBACK_MIN_ATTEMPTS = 10  # Pas na dit aantal writes de threshold controleren
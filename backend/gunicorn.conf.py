@@ -0,0 +1,77 @@
+# backend/gunicorn.conf.py
+#
+# Start vanuit backend/:  gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Er zijn twee pools, te kiezen met WEB_POOL:
+#   web   (default) dashboard reads en kleine writes, veel threads, workers worden
+#         regelmatig vervangen (max_requests) en krijgen 30 s om af te ronden.
+#   runs  lange kortingsruns: POST /api/discounts, /api/discounts/import,
+#         /api/discounts/<id>/rollback en DELETE /api/discounts/<id>. Eén thread per
+#         worker, workers worden nooit vanzelf vervangen en krijgen bij een restart
+#         WEB_GRACEFUL_TIMEOUT (default 30 minuten) om een lopende run af te maken.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app                               # web, :5001
+#   WEB_POOL=runs gunicorn -c gunicorn.conf.py wsgi:app                 # runs, :5002
+#
+# De reverse proxy stuurt de run-paden naar de runs pool, bijvoorbeeld nginx:
+#   location ~ ^/api/discounts(/import|/\d+|/\d+/rollback)?$ {
+#       if ($request_method = GET) { proxy_pass http://127.0.0.1:5001; }
+#       proxy_pass http://127.0.0.1:5002;
+#       proxy_read_timeout 1800s;
+#   }
+#   location /api/ { proxy_pass http://127.0.0.1:5001; }
+#
+# Let op: een run die toch in de web pool terechtkomt, wordt afgebroken zodra die
+# worker max_requests bereikt of bij een HUP/deploy na graceful_timeout. Ook in de
+# runs pool overleeft een run een restart niet als die langer duurt dan
+# WEB_GRACEFUL_TIMEOUT; het apply journal maakt zo'n halve run wel terug te draaien.
+#
+# Alle instellingen zijn via environment variabelen aan te passen:
+#   WEB_WORKERS           processen (web: 2 x CPU cores + 1, runs: 2)
+#   WEB_THREADS           threads per proces (web: 4, runs: 1)
+#   WEB_TIMEOUT           seconden dat een worker proces stil mag zijn. Met gthread geldt
+#                         dit voor het proces, niet per request.
+#   WEB_GRACEFUL_TIMEOUT  seconden om lopende requests af te maken bij een restart
+#   WEB_MAX_REQUESTS      requests waarna een worker wordt vervangen, 0 = nooit
+import multiprocessing
+import os
+
+pool = os.environ.get('WEB_POOL', 'web')
+if pool not in ('web', 'runs'):
+    raise ValueError(f"WEB_POOL must be 'web' or 'runs', not {pool!r}")
+runs = pool == 'runs'
+
+bind = os.environ.get('WEB_BIND', '127.0.0.1:5002' if runs else '127.0.0.1:5001')
+workers = int(os.environ.get('WEB_WORKERS', 2 if runs else multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 1 if runs else 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 1800 if runs else 30))
+keepalive = 5
+
+# Web workers af en toe vervangen tegen geheugengroei, run workers nooit midden in een run
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0 if runs else 1000))
+max_requests_jitter = 0 if runs else 100
+
+# App één keer laden in de master, workers forken daarna met alles al geïmporteerd
+preload_app = True
+proc_name = f"discountdash-{pool}"
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Verbindingen mogen niet gedeeld worden tussen geforkte processen"""
+    from app.models.discount import get_engine
+    from app.services.shopware import ShopwareService
+
+    get_engine().dispose(close=False)
+    try:
+        shopware_service = ShopwareService()
+        shopware_service.reset_connections()
+        if shopware_service.warm_up():
+            server.log.info(f"Worker {worker.pid}: Shopware token ready")
+    except Exception as e:
+        # Geen warme verbinding is geen reden om de worker niet te starten
+        server.log.warning(f"Worker {worker.pid}: Shopware warm-up failed: {str(e)}")
@@ -1,6 +1,8 @@
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)  # 5000 is default, we kunnen ook 3000 of 8080 gebruiken
\ No newline at end of file
+    # Alleen voor development, productie draait via gunicorn (zie gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1', port=5001)  # 5000 is default, we kunnen ook 3000 of 8080 gebruiken
\ No newline at end of file
@@ -0,0 +1,17 @@
+import pytest
+
+from app import create_app
+from app.models.discount import Session
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # SQLite bestanden (credentials.db, discounts.db) in een tijdelijke map
+    monkeypatch.chdir(tmp_path)
+    yield create_app()
+    Session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,129 @@
+import io
+import threading
+import time
+
+import pytest
+
+from app.routes import api
+
+
+def test_query_plan_without_json_body_is_bad_request(client):
+    response = client.post('/api/query-plan')
+
+    assert response.status_code == 400
+    assert response.json['status'] == 'error'
+
+
+def test_query_plan_returns_compiled_filter(client):
+    response = client.post('/api/query-plan', json={'conditions': [
+        {'operator': 'OR', 'conditions': [
+            {'type': 'tag', 'value': 't1'},
+            {'type': 'tag', 'value': 't2'},
+        ]}
+    ]})
+
+    assert response.status_code == 200
+    assert response.json['data']['filter'] == [
+        {"type": "equalsAny", "field": "product.tagIds", "value": ['t1', 't2']}
+    ]
+
+
+VALID_CONDITIONS = '"[{""operator"": ""AND"", ""conditions"": [{""type"": ""tag"", ""value"": ""t1""}]}]"'
+
+
+@pytest.mark.parametrize('row, message', [
+    ('Sale,,' + VALID_CONDITIONS, 'Line 2: missing required field: percentage'),
+    ('Sale,10,"[{""operator"": ""AND"", ""conditions"": []}]"',
+     'Line 2: conditions do not contain any valid condition'),
+    ('Sale,10,"[""junk""]"', 'Line 2: every condition group must be an object with a conditions list'),
+])
+def test_import_csv_with_invalid_row_is_bad_request(client, row, message):
+    content = f'name,percentage,conditions\n{row}\n'.encode()
+
+    response = client.post(
+        '/api/discounts/import',
+        data={'file': (io.BytesIO(content), 'discounts.csv')},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 400
+    assert response.json['message'] == message
+
+
+def test_import_json_with_junk_conditions_is_bad_request(client):
+    response = client.post('/api/discounts/import', json=[{'name': 'Sale', 'percentage': 10, 'conditions': ['junk']}])
+
+    assert response.status_code == 400
+
+
+class FakePrices:
+    def __init__(self):
+        self.calls = []
+
+    def get_product_prices(self, product_ids=None, page=1, limit=100):
+        self.calls.append((product_ids, page, limit))
+        return {'data': [{'id': 'p1'}], 'total': 250}
+
+    def sync_product_prices(self, updates, batch_size=100, min_interval=0):
+        return [{'id': update['id'], 'status': 'success'} for update in updates]
+
+
+def test_price_pages_always_send_a_limit(app, client):
+    fake = FakePrices()
+    app.extensions['shopware_service'] = fake
+
+    response = client.get('/api/products/prices?page=2')
+    client.get('/api/products/prices?ids=a,b&ids=c')
+
+    assert fake.calls == [(None, 2, 100), (['a', 'b', 'c'], 1, 3)]
+    assert response.json['limit'] == 100
+    assert response.json['has_more'] is True
+
+
+@pytest.mark.parametrize('update', [
+    {'id': 'p1', 'price': 'ten'},
+    {'id': 'p1', 'price': True},
+    {'id': 'p1', 'price': 10, 'listPrice': '12'},
+])
+def test_patch_rejects_non_numeric_prices(app, client, update):
+    app.extensions['shopware_service'] = FakePrices()
+
+    response = client.patch('/api/products/prices', json=[{'id': 'p0', 'price': 5}, update])
+
+    assert response.status_code == 400
+    assert response.json['message'].startswith('Update 2:')
+
+
+def test_rollback_of_unknown_discount_is_not_found(client):
+    response = client.post('/api/discounts/404/rollback')
+
+    assert response.status_code == 404
+    assert response.json['message'] == 'Discount not found'
+
+
+def test_discount_service_uses_app_config(app, client):
+    app.config['SYNC_BATCH_SIZE'] = 7
+    client.get('/api/discounts')
+
+    assert app.extensions['discount_service'].config['SYNC_BATCH_SIZE'] == 7
+
+
+def test_services_are_created_once_under_concurrent_requests(app):
+    created = []
+
+    def factory():
+        time.sleep(0.01)
+        created.append(object())
+        return created[-1]
+
+    def get():
+        with app.app_context():
+            api._get_service('slow_service', factory)
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
@@ -0,0 +1,240 @@
+import threading
+
+import pytest
+
+from app.models.discount import ApplyJournalEntry, Discount, Session
+from app.services.discount_service import DiscountService
+
+
+class FakeShopware:
+    """Stands in for ShopwareService, records the sync writes"""
+
+    def __init__(self, fail_sync=False):
+        self.fail_sync = fail_sync
+        self.synced = []
+
+    def sync_product_prices(self, updates, batch_size=100, min_interval=0):
+        if self.fail_sync:
+            raise ConnectionError("Shopware unreachable")
+        self.synced.extend(updates)
+        return [{'id': update['id'], 'status': 'success'} for update in updates]
+
+
+@pytest.fixture
+def service(app):
+    service = DiscountService(app.config)
+    service.shopware_service = FakeShopware()
+    return service
+
+
+def add_journaled_discount(product_ids):
+    session = Session()
+    discount = Discount(name='Sale', percentage=10, conditions=[], affected_products=len(product_ids))
+    session.add(discount)
+    session.flush()
+    for product_id in product_ids:
+        session.add(ApplyJournalEntry(
+            discount_id=discount.id, product_id=product_id, old_price=10.0, new_price=9.0
+        ))
+    session.commit()
+    discount_id = discount.id
+    session.close()
+    return discount_id
+
+
+def journal_rows():
+    session = Session()
+    rows = [(entry.discount_id, entry.product_id) for entry in session.query(ApplyJournalEntry)]
+    session.close()
+    return rows
+
+
+def test_delete_removes_journal_and_never_reuses_the_id(service):
+    discount_id = add_journaled_discount(['p1'])
+
+    service.delete_discount(discount_id)
+
+    assert service.shopware_service.synced == [{'id': 'p1', 'price': 10.0, 'listPrice': None}]
+    assert journal_rows() == []
+    assert add_journaled_discount([]) != discount_id
+
+
+def test_delete_keeps_discount_when_restore_fails(service):
+    discount_id = add_journaled_discount(['p1'])
+    service.shopware_service = FakeShopware(fail_sync=True)
+
+    with pytest.raises(Exception, match='could not be restored'):
+        service.delete_discount(discount_id)
+
+    assert journal_rows() == [(discount_id, 'p1')]
+    assert service.get_discount(discount_id)['id'] == discount_id
+
+
+CONDITIONS = [{'operator': 'AND', 'conditions': [{'type': 'tag', 'value': 't1'}]}]
+
+
+class FakeRecord:
+    def __init__(self, product_id, gross):
+        self.id = product_id
+        self.gross = gross
+        self.list_price = None
+
+
+def catalog_product(product_id, gross, tags):
+    return {'id': product_id, 'price': [{'gross': gross}], 'manufacturerId': None, 'categoryTree': [], 'tagIds': tags}
+
+
+class ImportShopware(FakeShopware):
+    """Catalog for imports, batches listed in fail_batches fail"""
+
+    def __init__(self, products, fail_batches=()):
+        super().__init__()
+        self.products = products
+        self.fail_batches = set(fail_batches)
+        self.searches = []
+
+    def iter_search_products(self, product_filter, fields):
+        self.searches.append(product_filter)
+        return iter(self.products)
+
+    def iter_sync_product_prices(self, updates, batch_size=100, min_interval=0):
+        for number, start in enumerate(range(0, len(updates), batch_size)):
+            status = 'error' if number in self.fail_batches else 'success'
+            yield [{'id': update['id'], 'status': status} for update in updates[start:start + batch_size]]
+
+
+def tag_conditions(tag):
+    return [{'operator': 'AND', 'conditions': [{'type': 'tag', 'value': tag}]}]
+
+
+def test_import_journals_each_written_batch(app, service):
+    app.config['SYNC_BATCH_SIZE'] = 1
+    service.shopware_service = ImportShopware(
+        [catalog_product('p1', 10.0, ['t1']), catalog_product('p2', 20.0, ['t1'])], fail_batches={1}
+    )
+
+    summary = service.import_discounts([{'name': 'Sale', 'percentage': '50', 'conditions': CONDITIONS}])
+
+    assert summary[0]['affected_products'] == 1
+    assert summary[0]['failed_products'] == 1
+    assert journal_rows() == [(summary[0]['id'], 'p1')]
+
+
+def test_import_resolves_overlapping_discounts_with_one_search(service):
+    service.shopware_service = ImportShopware([
+        catalog_product('p1', 10.0, ['t1']),
+        catalog_product('p2', 10.0, ['t1', 't2']),
+        catalog_product('p3', 10.0, ['t2']),
+        catalog_product('p4', 10.0, ['t3']),
+    ])
+
+    summary = service.import_discounts([
+        {'name': 'One', 'percentage': 10, 'conditions': tag_conditions('t1')},
+        {'name': 'Two', 'percentage': 20, 'conditions': tag_conditions('t2')},
+    ])
+
+    assert len(service.shopware_service.searches) == 1
+    assert service.shopware_service.searches[0][0]['operator'] == 'OR'
+    assert [(s['affected_products'], s['skipped_products']) for s in summary] == [(2, 0), (1, 1)]
+    assert sorted(journal_rows()) == [(summary[0]['id'], 'p1'), (summary[0]['id'], 'p2'), (summary[1]['id'], 'p3')]
+
+
+def test_import_rolls_back_when_too_many_writes_fail(app, service):
+    app.config['SYNC_BATCH_SIZE'] = 5
+    app.config['ROLLBACK_MIN_ATTEMPTS'] = 10
+    products = [catalog_product(f'p{i}', 10.0, ['t1']) for i in range(15)]
+    service.shopware_service = ImportShopware(products, fail_batches={1})
+
+    summary = service.import_discounts([{'name': 'Sale', 'percentage': 10, 'conditions': CONDITIONS}])
+
+    # Na twee batches is de helft mislukt: de eerste batch wordt teruggezet, de derde nooit geschreven
+    assert summary[0]['rolled_back'] == {'restored': 5, 'failed': 0}
+    assert summary[0]['affected_products'] == 0
+    assert [u['id'] for u in service.shopware_service.synced] == [f'p{i}' for i in range(5)]
+
+
+@pytest.mark.parametrize('item, message', [
+    ({'name': '', 'percentage': '10', 'conditions': CONDITIONS}, 'name'),
+    ({'name': 'Sale', 'percentage': None, 'conditions': CONDITIONS}, 'percentage'),
+    ({'name': 'Sale', 'percentage': 'ten', 'conditions': CONDITIONS}, 'not a number'),
+    ({'name': 'Sale', 'percentage': '150', 'conditions': CONDITIONS}, 'between 0 and 100'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': []}, 'conditions'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': [{'operator': 'AND', 'conditions': []}]}, 'any valid condition'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': tag_conditions('')}, 'any valid condition'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': [
+        {'operator': 'OR', 'conditions': [{'type': 'unknown', 'value': 'x'}]}
+    ]}, 'any valid condition'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': ['junk']}, 'condition group'),
+    ({'name': 'Sale', 'percentage': '10', 'conditions': [{'conditions': ['junk']}]}, 'every condition'),
+])
+def test_import_rejects_invalid_discounts(service, item, message):
+    with pytest.raises(ValueError, match=message):
+        service.import_discounts([item])
+
+
+def test_each_thread_gets_its_own_session(service):
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(service.db))
+    thread.start()
+    thread.join()
+
+    assert sessions[0] is not service.db
+    assert service.db is service.db
+
+
+class CatalogShopware(FakeShopware):
+    """Catalog of ten products, writes for fail_ids fail and restores for stuck_ids fail"""
+
+    def __init__(self, fail_ids=(), stuck_ids=()):
+        super().__init__()
+        self.fail_ids = set(fail_ids)
+        self.stuck_ids = set(stuck_ids)
+
+    def iter_matching_price_records(self, conditions):
+        return [FakeRecord(f'p{i}', 10.0) for i in range(10)]
+
+    def iter_sync_product_prices(self, updates, batch_size=100, min_interval=0):
+        for start in range(0, len(updates), batch_size):
+            yield [{
+                'id': update['id'],
+                'status': 'error' if update['id'] in self.fail_ids else 'success'
+            } for update in updates[start:start + batch_size]]
+
+    def sync_product_prices(self, updates, batch_size=100, min_interval=0):
+        self.synced.extend(updates)
+        return [{
+            'id': update['id'],
+            'status': 'error' if update['id'] in self.stuck_ids else 'success'
+        } for update in updates]
+
+
+def test_create_discount_journals_every_write(service):
+    service.shopware_service = CatalogShopware(fail_ids={'p3'})
+
+    result = service.create_discount({'name': 'Sale', 'percentage': 20, 'conditions': CONDITIONS})
+
+    assert result['affected_products'] == 9
+    assert result['failed_products'] == 1
+    assert len(journal_rows()) == 9
+    assert 'rolled_back' not in result
+
+
+def test_create_discount_rolls_back_when_too_many_writes_fail(app, service):
+    app.config['SYNC_BATCH_SIZE'] = 5
+    app.config['ROLLBACK_MIN_ATTEMPTS'] = 5
+    service.shopware_service = CatalogShopware(fail_ids={'p0', 'p1', 'p2'}, stuck_ids={'p4'})
+
+    result = service.create_discount({'name': 'Sale', 'percentage': 20, 'conditions': CONDITIONS})
+
+    # Eerste batch: 3 van 5 mislukt, daarna wordt p3 en p4 teruggezet en stopt de run
+    assert [update['id'] for update in service.shopware_service.synced] == ['p3', 'p4']
+    assert result['rolled_back'] == {'restored': 1, 'failed': 1}
+    assert result['affected_products'] == 1  # p4 draagt de korting nog
+
+
+def test_manual_rollback_keeps_failed_restores_counted(service):
+    discount_id = add_journaled_discount(['p1', 'p2'])
+    service.shopware_service = CatalogShopware(stuck_ids={'p2'})
+
+    assert service.rollback_discount(discount_id) == {'restored': 1, 'failed': 1}
+    assert service.get_discount(discount_id)['affected_products'] == 1
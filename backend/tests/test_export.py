@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from app.models.discount import ApplyJournalEntry, Discount, Session
+
+
+@pytest.fixture
+def discount_id(app):
+    session = Session()
+    discount = Discount(name='Sale', percentage=10, conditions=[])
+    session.add(discount)
+    session.commit()
+    discount_id = discount.id
+    session.close()
+    return discount_id
+
+
+def add_entries(discount_id, *product_ids):
+    session = Session()
+    for product_id in product_ids:
+        session.add(ApplyJournalEntry(discount_id=discount_id, product_id=product_id, old_price=10.0, new_price=9.0))
+    session.commit()
+    session.close()
+
+
+def test_csv_export_streams_journal_rows(client, discount_id):
+    add_entries(discount_id, 'p1', 'p2')
+
+    response = client.get(f'/api/discounts/{discount_id}/products')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == f'attachment; filename=discount-{discount_id}-products.csv'
+    assert response.data.decode().splitlines() == [
+        'product_id,old_price,new_price,rolled_back',
+        'p1,10.0,9.0,False',
+        'p2,10.0,9.0,False',
+    ]
+
+
+def test_csv_export_of_empty_journal_is_header_only(client, discount_id):
+    response = client.get(f'/api/discounts/{discount_id}/products?format=csv')
+
+    assert response.data.decode().splitlines() == ['product_id,old_price,new_price,rolled_back']
+
+
+def test_ndjson_export(client, discount_id):
+    add_entries(discount_id, 'p1')
+
+    response = client.get(f'/api/discounts/{discount_id}/products?format=ndjson')
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.data.decode().splitlines()] == [
+        {'product_id': 'p1', 'old_price': 10.0, 'new_price': 9.0, 'rolled_back': False}
+    ]
+
+
+def test_unknown_format_is_bad_request(client, discount_id):
+    assert client.get(f'/api/discounts/{discount_id}/products?format=xml').status_code == 400
+
+
+def test_unknown_discount_is_not_found(client):
+    assert client.get('/api/discounts/404/products').status_code == 404
+
+
+class BrokenDiscountService:
+    def iter_applied_products(self, discount_id):
+        raise RuntimeError('database is locked')
+
+
+def test_database_errors_are_not_reported_as_not_found(app, client):
+    app.extensions['discount_service'] = BrokenDiscountService()
+
+    assert client.get('/api/discounts/1/products').status_code == 500
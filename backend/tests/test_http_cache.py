@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from app.routes import http_cache
+
+
+class FakeShopware:
+    def __init__(self):
+        self.calls = 0
+
+    def get_tags(self):
+        self.calls += 1
+        return [{'id': str(i), 'name': 'tag'} for i in range(100)]
+
+    def get_product_prices(self, product_ids=None, page=1, limit=None):
+        self.calls += 1
+        return {'data': [{'id': 'p1'}], 'total': 1}
+
+
+@pytest.fixture
+def shopware(app):
+    http_cache.clear_cache()
+    fake = FakeShopware()
+    app.extensions['shopware_service'] = fake
+    yield fake
+    http_cache.clear_cache()
+
+
+def test_cached_read_answers_if_none_match_with_304(client, shopware):
+    first = client.get('/api/tag', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/api/tag', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert second.status_code == 304
+    assert shopware.calls == 1
+
+
+def test_cache_is_bounded_and_drops_expired_entries(app, client, shopware):
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 2
+    for page in range(5):
+        client.get(f'/api/tag?page={page}')
+    assert list(http_cache._cache) == ['/api/tag?page=3', '/api/tag?page=4']
+
+    for entry in http_cache._cache.values():
+        entry['expires'] = 0
+    client.get('/api/tag?page=5')
+    assert list(http_cache._cache) == ['/api/tag?page=5']
+
+
+def test_product_prices_are_not_cached_server_side(client, shopware):
+    first = client.get('/api/products/prices')
+    second = client.get('/api/products/prices', headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 304
+    assert shopware.calls == 2
+    assert not http_cache._cache
+
+
+def test_brotli_is_preferred_when_installed(client, shopware):
+    brotli = pytest.importorskip('brotli')
+
+    response = client.get('/api/tag', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['ETag'].endswith('-br"')
+    assert json.loads(brotli.decompress(response.data))['status'] == 'success'
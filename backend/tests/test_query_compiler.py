@@ -0,0 +1,123 @@
+from app.services.query_compiler import any_of, compile_group, explain_conditions, matches, matches_all
+
+
+def condition(type_, value, operator='equals'):
+    return {'type': type_, 'value': value, 'operator': operator}
+
+
+def test_or_group_folds_same_field_into_equals_any():
+    group_filter, plan = compile_group({'operator': 'OR', 'conditions': [
+        condition('manufacturer', 'm1'),
+        condition('manufacturer', 'm2'),
+        condition('manufacturer', 'm1'),
+        condition('tag', 't1'),
+    ]})
+
+    assert group_filter == {
+        "type": "multi",
+        "operator": "OR",
+        "queries": [
+            {"type": "equalsAny", "field": "product.manufacturerId", "value": ['m1', 'm2']},
+            {"type": "equals", "field": "product.tagIds", "value": 't1'},
+        ]
+    }
+    assert plan[-1] == "OR: merged 4 conditions into 2 filters"
+
+
+def test_or_group_with_one_field_is_a_single_filter():
+    group_filter, _ = compile_group({'operator': 'OR', 'conditions': [
+        condition('category', 'c1'),
+        condition('category', 'c2'),
+    ]})
+
+    assert group_filter == {"type": "equalsAny", "field": "product.categoryTree", "value": ['c1', 'c2']}
+
+
+def test_and_group_keeps_positive_values_separate():
+    group_filter, _ = compile_group({'operator': 'AND', 'conditions': [
+        condition('category', 'c1'),
+        condition('category', 'c2'),
+    ]})
+
+    assert group_filter == {
+        "type": "multi",
+        "operator": "AND",
+        "queries": [
+            {"type": "equals", "field": "product.categoryTree", "value": 'c1'},
+            {"type": "equals", "field": "product.categoryTree", "value": 'c2'},
+        ]
+    }
+
+
+def test_and_group_folds_negations_into_one_not_filter():
+    group_filter, plan = compile_group({'operator': 'AND', 'conditions': [
+        condition('category', 'c1'),
+        condition('tag', 't1', 'not_equals'),
+        condition('tag', 't2', 'not_equals'),
+    ]})
+
+    assert group_filter["queries"][1] == {
+        "type": "not",
+        "operator": "AND",
+        "queries": [{"type": "equalsAny", "field": "product.tagIds", "value": ['t1', 't2']}]
+    }
+    assert "AND: NOT product.tagIds equalsAny ['t1', 't2']" in plan
+
+
+def test_or_group_negations_stay_separate():
+    group_filter, _ = compile_group({'operator': 'OR', 'conditions': [
+        condition('tag', 't1', 'not_equals'),
+        condition('tag', 't2', 'not_equals'),
+    ]})
+
+    assert group_filter["operator"] == "OR"
+    assert [q["queries"][0]["value"] for q in group_filter["queries"]] == ['t1', 't2']
+    assert all(q["type"] == "not" for q in group_filter["queries"])
+
+
+def test_group_without_valid_conditions_is_skipped():
+    assert compile_group({'operator': 'AND', 'conditions': [
+        condition('tag', ''),
+        condition('unknown', 'x'),
+    ]}) == (None, [])
+
+
+def test_explain_conditions_combines_groups():
+    result = explain_conditions([
+        {'operator': 'OR', 'conditions': [condition('manufacturer', 'm1')]},
+        {'operator': 'AND', 'conditions': [condition('tag', '')]},
+        {'operator': 'AND', 'conditions': [condition('tag', 't1')]},
+    ])
+
+    assert result['filter'] == [
+        {"type": "equals", "field": "product.manufacturerId", "value": 'm1'},
+        {"type": "equals", "field": "product.tagIds", "value": 't1'},
+    ]
+    assert result['condition_count'] == 3
+    assert result['filter_count'] == 2
+    assert "group 2: skipped, no valid conditions" in result['plan']
+
+
+def test_matches_follows_shopware_list_semantics():
+    product = {'manufacturerId': 'm1', 'categoryTree': ['c1', 'c2'], 'tagIds': ['t1']}
+    group_filter, _ = compile_group({'operator': 'AND', 'conditions': [
+        condition('category', 'c2'),
+        condition('manufacturer', 'm1'),
+        condition('tag', 't2', 'not_equals'),
+    ]})
+
+    assert matches(group_filter, product)
+    assert not matches(group_filter, dict(product, tagIds=['t2']))
+    assert not matches({"type": "equalsAny", "field": "product.manufacturerId", "value": ['m2', 'm3']}, product)
+
+
+def test_any_of_combines_filter_lists_with_or():
+    first = explain_conditions([{'conditions': [condition('tag', 't1')]}])['filter']
+    second = explain_conditions([{'conditions': [condition('tag', 't2')]}])['filter']
+
+    combined = any_of([first, second])
+
+    assert any_of([first]) == first
+    assert combined[0]['operator'] == 'OR'
+    assert matches_all(combined, {'tagIds': ['t2']})
+    assert not matches_all(combined, {'tagIds': ['t3']})
@@ -0,0 +1,45 @@
+from app.services.shopware import ShopwareService
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, products):
+        self.products = products
+
+    def json(self):
+        return {'data': self.products}
+
+
+class FakeHttp:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def post(self, url, headers=None, json=None):
+        self.requests.append(json)
+        return FakeResponse(self.pages[len(self.requests) - 1])
+
+
+def make_service(http):
+    service = object.__new__(ShopwareService)  # Buiten de singleton om
+    service.http = http
+    service.base_url = 'https://shop.test'
+    service.access_token = 'token'
+    service.ensure_token = lambda: True
+    return service
+
+
+def product(product_id, gross):
+    return {'id': product_id, 'price': [{'gross': gross, 'listPrice': {'gross': gross + 1}}]}
+
+
+def test_price_records_are_paged_in_a_stable_order():
+    http = FakeHttp([[product('a', 1), product('b', 2)], [product('c', 3)]])
+    service = make_service(http)
+
+    records = list(service.iter_matching_price_records([], page_size=2))
+
+    assert [(r.id, r.gross, r.list_price) for r in records] == [('a', 1.0, 2.0), ('b', 2.0, 3.0), ('c', 3.0, 4.0)]
+    assert [r['page'] for r in http.requests] == [1, 2]
+    assert all(r['sort'] == [{"field": "id", "order": "ASC"}] for r in http.requests)